@@ -1,17 +1,48 @@
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
+import hmac
 import os
-import json
 import io
+import queue
+import re
+import shutil
+import tempfile
+import time
 import zipfile
 import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from threading import Lock
-from typing import Any
-from datetime import datetime, timedelta
+from threading import Lock, Thread
+from typing import Annotated, Any, NamedTuple
+from datetime import datetime
 
+import jwt
+import msgspec
 import numpy as np
+import orjson
 import trimesh
+
+try:
+    # Optional: libxml2-backed parser filters tags at the C level,
+    # so Python only ever sees vertex/triangle elements.
+    from lxml import etree as LET
+except ImportError:
+    LET = None
+
+try:
+    # Optional: 2-3x request throughput on small JSON endpoints. Uvicorn
+    # picks uvloop up on its own (--loop auto); setting the policy here
+    # covers embedded/processed runs too.
+    import uvloop
+except ImportError:
+    pass
+else:
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 from dotenv import load_dotenv
 from fastapi import (
     FastAPI,
@@ -20,12 +51,14 @@ from fastapi import (
     File,
     Form,
     Depends,
+    Request,
+    Response,
 )
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, BeforeValidator, ConfigDict
 from passlib.context import CryptContext
-from jose import jwt, JWTError
 
 # ----------------------------
 # ENV
@@ -46,6 +79,9 @@ ALLOWED_ORIGINS = _csv_env_list(
 # Public default printer lock (customers)
 PUBLIC_DEFAULT_MACHINE_ID = os.getenv("PUBLIC_DEFAULT_MACHINE_ID", "anycubic_kobra_s1_combo")
 
+# Upload cap for /estimate (reject before parsing, not after OOM)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
 # ----------------------------
 # JWT Auth (Staff)
 # ----------------------------
@@ -53,7 +89,9 @@ JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "CHANGE_ME")  # MUST override in .e
 JWT_EXPIRE_MINUTES = int(os.getenv("JWT_EXPIRE_MINUTES", "10080"))  # 7 days default
 JWT_ALG = "HS256"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# argon2 first for new hashes (faster verify at comparable security);
+# existing bcrypt hashes in STAFF_USERS/ADMIN_USERS keep verifying.
+pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
 bearer = HTTPBearer(auto_error=False)
 
 
@@ -62,10 +100,13 @@ def _parse_users_env(env_name: str) -> dict[str, str]:
     USERS env format: user1:hash,user2:hash
     Example:
       STAFF_USERS=ba4b0d:$2b$12$...,negin:$2b$12$...
+
+    Argon2 hashes contain commas ($argon2id$v=19$m=65536,t=3,p=4$...),
+    so only commas that start a new ``user:`` entry act as separators.
     """
     raw = os.getenv(env_name, "") or ""
     out: dict[str, str] = {}
-    for part in raw.split(","):
+    for part in re.split(r",(?=[^:,]+:)", raw):
         part = part.strip()
         if not part or ":" not in part:
             continue
@@ -84,10 +125,86 @@ STAFF_USERS = _parse_users_env("STAFF_USERS")
 ADMIN_USERS = _parse_users_env("ADMIN_USERS")
 
 
+class _TTLCache:
+    """Tiny bounded TTL cache (thread-safe) for hot, idempotent lookups."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self._data: dict = {}
+        self._maxsize = maxsize
+        self._ttl = ttl
+        self._lock = Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None or hit[0] < now:
+                return None
+            return hit[1]
+
+    def set(self, key, value) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._data) >= self._maxsize:
+                for k in [k for k, (t, _) in self._data.items() if t < now]:
+                    del self._data[k]
+                while len(self._data) >= self._maxsize:
+                    del self._data[next(iter(self._data))]
+            self._data[key] = (now + self._ttl, value)
+
+
+# Successful bcrypt verdicts, keyed by (user, sha256(password), hash).
+# Lets a client that re-authenticates within the TTL skip the ~100ms
+# bcrypt round; failures are never cached.
+_LOGIN_CACHE = _TTLCache(maxsize=1024, ttl=60)
+
+
+async def _verify_password(username: str, password: str, stored_hash: str) -> bool:
+    key = (username, hashlib.sha256(password.encode("utf-8")).hexdigest(), stored_hash)
+    if _LOGIN_CACHE.get(key):
+        return True
+    try:
+        ok = await asyncio.to_thread(pwd_context.verify, password, stored_hash)
+    except ValueError:
+        # Malformed/unrecognized stored hash — treat as a failed login
+        # rather than letting passlib's error surface as a 500.
+        return False
+    if ok:
+        _LOGIN_CACHE.set(key, True)
+    return ok
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+# The JWT header never changes, so encode it once at import time.
+_JWT_HEADER_B64 = _b64url(orjson.dumps({"alg": JWT_ALG, "typ": "JWT"}))
+_JWT_KEY = JWT_SECRET_KEY.encode("utf-8")
+
+
 def create_access_token(username: str, role: str) -> str:
-    exp = datetime.utcnow() + timedelta(minutes=JWT_EXPIRE_MINUTES)
-    payload = {"sub": username, "role": role, "exp": exp}
-    return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALG)
+    exp = int(time.time()) + JWT_EXPIRE_MINUTES * 60
+    payload = _b64url(orjson.dumps({"sub": username, "role": role, "exp": exp}))
+    signing_input = f"{_JWT_HEADER_B64}.{payload}"
+    sig = hmac.new(_JWT_KEY, signing_input.encode("ascii"), hashlib.sha256).digest()
+    return f"{signing_input}.{_b64url(sig)}"
+
+
+@lru_cache(maxsize=4096)
+def _verify_token(token: str) -> tuple[str, str, int]:
+    """Decode and verify a bearer token.
+
+    Safe to memoize: an HS256 token always verifies to the same claims,
+    and expiry is re-checked by the caller on every request.
+    """
+    payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALG])
+    username = payload.get("sub")
+    role = payload.get("role")
+    exp = payload.get("exp")
+    if not username or not role or exp is None:
+        raise jwt.InvalidTokenError("Missing claims")
+    return str(username), str(role), int(exp)
 
 
 def get_current_user(creds: HTTPAuthorizationCredentials = Depends(bearer)) -> dict:
@@ -97,24 +214,21 @@ def get_current_user(creds: HTTPAuthorizationCredentials = Depends(bearer)) -> d
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    token = creds.credentials
     try:
-        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALG])
-        username = payload.get("sub")
-        role = payload.get("role")
-        if not username or not role:
-            raise HTTPException(
-                status_code=401,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return {"username": str(username), "role": str(role)}
-    except JWTError:
+        username, role, exp = _verify_token(creds.credentials)
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if exp < time.time():
         raise HTTPException(
             status_code=401,
             detail="Invalid token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return {"username": username, "role": role}
 
 
 def get_current_staff(user=Depends(get_current_user)) -> str:
@@ -133,7 +247,11 @@ def get_current_admin(user=Depends(get_current_user)) -> str:
 # ----------------------------
 # App
 # ----------------------------
-app = FastAPI(title="3DJAT Quote API", version="0.7.0")
+app = FastAPI(
+    title="3DJAT Quote API",
+    version="0.7.0",
+    default_response_class=ORJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -144,45 +262,176 @@ app.add_middleware(
     max_age=86400,
 )
 
+_UPLOAD_PATHS = {"/estimate", "/staff/estimate"}
+
+
+@app.middleware("http")
+async def _reject_oversized_uploads(request: Request, call_next):
+    # Runs before Starlette parses the multipart body, so an oversized
+    # declared upload is refused without reading or spooling any of it.
+    # Chunked/lying clients are still caught by the running byte count
+    # inside the estimate handler.
+    if request.method == "POST" and request.url.path in _UPLOAD_PATHS:
+        cl = request.headers.get("content-length")
+        if cl and cl.isdigit() and int(cl) > MAX_UPLOAD_BYTES:
+            return ORJSONResponse({"detail": "Model file too large"}, status_code=413)
+    return await call_next(request)
+
 DATA_PATH = Path(__file__).parent / "data.json"
 BACKUP_DIR = Path(__file__).parent / "backups"
 AUDIT_LOG_PATH = BACKUP_DIR / "audit.jsonl"
 
 CONFIG_LOCK = Lock()
 
+# Audit records are queued and flushed in batches by a single background
+# thread (handlers run in the threadpool, so a thread-safe queue is the
+# right primitive here, not an asyncio one), keeping the admin PUT path
+# free of file I/O and amortizing the open/write across bursts.
+_AUDIT_QUEUE: queue.SimpleQueue = queue.SimpleQueue()
+
+
+def _audit_writer() -> None:
+    while True:
+        records = [_AUDIT_QUEUE.get()]
+        try:
+            while True:
+                records.append(_AUDIT_QUEUE.get_nowait())
+        except queue.Empty:
+            pass
+        # Best-effort, like the inline append it replaces
+        try:
+            AUDIT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with AUDIT_LOG_PATH.open("ab") as f:
+                f.write(b"".join(orjson.dumps(r) + b"\n" for r in records))
+        except Exception:
+            pass
+
+
+Thread(target=_audit_writer, name="audit-writer", daemon=True).start()
+
+
+def _tail_lines(path: Path, n: int, chunk_size: int = 64 * 1024) -> list[bytes]:
+    """Last n lines of a file, reading backwards in fixed-size chunks so
+    memory and I/O stay O(tail) however large the file grows."""
+    with path.open("rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(chunk_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return data.splitlines()[-n:]
+
 
 def _atomic_write_json(path: Path, payload: dict) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     tmp = path.with_suffix(path.suffix + ".tmp")
-    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.write_bytes(
+        orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    )
     tmp.replace(path)
 
 
 def save_data(new_data: dict, actor: str) -> None:
     """Atomically save config with backup + audit log."""
+    global _DATA_CACHE
     with CONFIG_LOCK:
         BACKUP_DIR.mkdir(parents=True, exist_ok=True)
         ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
         if DATA_PATH.exists():
             backup_path = BACKUP_DIR / f"data.{ts}.{actor}.json"
-            backup_path.write_text(DATA_PATH.read_text(encoding="utf-8"), encoding="utf-8")
+            # Hardlink is an O(1) inode op and safe here: _atomic_write_json
+            # replaces DATA_PATH with a fresh inode, leaving the link intact.
+            try:
+                os.link(DATA_PATH, backup_path)
+            except OSError:
+                shutil.copyfile(DATA_PATH, backup_path)
 
         _atomic_write_json(DATA_PATH, new_data)
 
-        # Append audit record (best-effort)
-        try:
-            AUDIT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-            rec = {"ts": ts, "actor": actor, "action": "save_config"}
-            with AUDIT_LOG_PATH.open("a", encoding="utf-8") as f:
-                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
-        except Exception:
-            pass
+        # Seed the data cache with what we just wrote so the next request
+        # doesn't have to re-read it. Derived caches (groups, estimate and
+        # quote coefficients) are mtime-keyed and refresh themselves.
+        _DATA_CACHE = (
+            DATA_PATH.stat().st_mtime_ns,
+            new_data,
+            {m["id"]: m for m in new_data["materials"]},
+            {m["id"]: m for m in new_data["machines"]},
+        )
 
+        # Append audit record (best-effort, flushed by the writer thread)
+        _AUDIT_QUEUE.put({"ts": ts, "actor": actor, "action": "save_config"})
 
-def load_data() -> dict:
-    if not DATA_PATH.exists():
+
+# (mtime_ns, data, materials-by-id, machines-by-id)
+_DATA_CACHE: tuple[int, dict, dict, dict] | None = None
+_DATA_CACHE_LOCK = Lock()
+
+
+def _load_data_cached() -> tuple[dict, dict, dict]:
+    """Return (data, mats_by_id, machines_by_id), re-reading data.json only
+    when its mtime changes (i.e. after an admin save)."""
+    global _DATA_CACHE
+    try:
+        mtime = DATA_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
         raise RuntimeError(f"data.json not found at: {DATA_PATH}")
-    return json.loads(DATA_PATH.read_text(encoding="utf-8"))
+
+    cache = _DATA_CACHE
+    if cache is not None and cache[0] == mtime:
+        return cache[1], cache[2], cache[3]
+
+    with _DATA_CACHE_LOCK:
+        cache = _DATA_CACHE
+        if cache is not None and cache[0] == mtime:
+            return cache[1], cache[2], cache[3]
+        data = orjson.loads(DATA_PATH.read_bytes())
+        mats_by_id = {m["id"]: m for m in data["materials"]}
+        machines_by_id = {m["id"]: m for m in data["machines"]}
+        _DATA_CACHE = (mtime, data, mats_by_id, machines_by_id)
+        return data, mats_by_id, machines_by_id
+
+
+def load_data() -> dict:
+    return _load_data_cached()[0]
+
+
+_QUALITY_MUL = {"draft": 0.75, "normal": 1.0, "fine": 1.35}
+
+
+@dataclass(frozen=True, slots=True)
+class _EstimateConfig:
+    """Estimate heuristics pre-parsed from settings, rebuilt on config change."""
+
+    volume_factor: float
+    time_per_cm3: float
+    fixed_min: float
+    mass_mul: float
+
+
+_ESTIMATE_CFG_CACHE: tuple[int, _EstimateConfig] | None = None
+
+
+def _estimate_cfg() -> _EstimateConfig:
+    global _ESTIMATE_CFG_CACHE
+    mtime = DATA_PATH.stat().st_mtime_ns
+    cached = _ESTIMATE_CFG_CACHE
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    s = load_data()["settings"]
+    infill = float(s.get("estimate_infill_pct", 0.2))
+    shell = float(s.get("estimate_shell_overhead", 0.18))
+    support = float(s.get("estimate_support_overhead", 0.05))
+    cfg = _EstimateConfig(
+        volume_factor=min(1.0, max(0.05, infill + shell + support)),
+        time_per_cm3=float(s.get("estimate_time_min_per_cm3", 2.8)),
+        fixed_min=float(s.get("estimate_time_fixed_min", 12)),
+        mass_mul=float(s.get("estimate_mass_multiplier", 1.0)),
+    )
+    _ESTIMATE_CFG_CACHE = (mtime, cfg)
+    return cfg
 
 
 
@@ -201,6 +450,11 @@ def _normalize_bool(v, default: bool) -> bool:
     return default
 
 
+# Lenient toggle: UIs may send null/strings, normalize inside validation
+# so no post-processing pass over the payload is needed.
+_LenientBool = Annotated[bool, BeforeValidator(lambda v: _normalize_bool(v, True))]
+
+
 def _validate_admin_config(payload: AdminConfigPayload) -> dict:
     # Ensure unique IDs
     mat_ids = [m.id for m in payload.materials]
@@ -211,19 +465,12 @@ def _validate_admin_config(payload: AdminConfigPayload) -> dict:
     if len(mc_ids) != len(set(mc_ids)):
         raise HTTPException(400, "Duplicate machine id detected")
 
-    # Normalize toggles for backward-compat (in case UI sends null/strings)
-    mats_out = []
-    for m in payload.materials:
-        d = m.model_dump()
-        d["is_public"] = _normalize_bool(d.get("is_public"), True)
-        d["is_active"] = _normalize_bool(d.get("is_active"), True)
-        mats_out.append(d)
-
-    mcs_out = []
-    for mc in payload.machines:
-        d = mc.model_dump()
-        d["is_active"] = _normalize_bool(d.get("is_active"), True)
-        mcs_out.append(d)
+    # Toggles were already normalized by _LenientBool during validation,
+    # so dict(m) skips model_dump's recursive serialization while keeping
+    # its key order (declared fields first, then extras) — data.json
+    # diffs stay readable.
+    mats_out = [dict(m) for m in payload.materials]
+    mcs_out = [dict(mc) for mc in payload.machines]
 
     cfg = {
         "settings": dict(payload.settings),
@@ -247,8 +494,8 @@ class MaterialItem(BaseModel):
     color: str = ""
     notes: str = ""
     # Admin toggles
-    is_public: bool = True
-    is_active: bool = True
+    is_public: _LenientBool = True
+    is_active: _LenientBool = True
     title_fa: str | None = None
 
 
@@ -260,7 +507,7 @@ class MachineItem(BaseModel):
     purchase_price: float
     life_hours: float
     maintenance_pct: float = 0.0
-    is_active: bool = True
+    is_active: _LenientBool = True
 
 
 class AdminConfigPayload(BaseModel):
@@ -269,33 +516,20 @@ class AdminConfigPayload(BaseModel):
     materials: list[MaterialItem]
     machines: list[MachineItem]
 
-class QuoteRequest(BaseModel):
+# msgspec Struct (not Pydantic): /quote is the hottest endpoint and
+# msgspec decodes+validates the body in C for a fraction of the cost.
+class QuoteRequest(msgspec.Struct):
     material_id: str
     machine_id: str
-    qty: int = Field(default=1, ge=1)
-    filament_grams: float = Field(ge=0)  # per item
-    print_time_minutes: float = Field(ge=0)  # per item
-    post_pro_hours: float = Field(default=0, ge=0)  # per item
-    extras: float = Field(default=0, ge=0)  # total order extras (toman)
-
-
-class QuoteResponse(BaseModel):
-    Matrial_t: float
-    power_t: float
-    downturn_t: float
-    Maintenance_t: float
-    Coloring_t: float
-    overhead_t: float
-    Extras: float
-    Total: float
-
-
-class EstimateResponse(BaseModel):
-    volume_cm3: float
-    bbox_mm: dict
-    estimated_grams: float
-    estimated_minutes: float
-    warnings: list[str] = []
+    filament_grams: Annotated[float, msgspec.Meta(ge=0)]  # per item
+    print_time_minutes: Annotated[float, msgspec.Meta(ge=0)]  # per item
+    qty: Annotated[int, msgspec.Meta(ge=1)] = 1
+    post_pro_hours: Annotated[float, msgspec.Meta(ge=0)] = 0  # per item
+    extras: Annotated[float, msgspec.Meta(ge=0)] = 0  # total order extras (toman)
+
+
+_QUOTE_DECODER = msgspec.json.Decoder(QuoteRequest)
+_QUOTE_ENCODER = msgspec.json.Encoder()
 
 
 class LoginRequest(BaseModel):
@@ -306,96 +540,226 @@ class LoginRequest(BaseModel):
 # ----------------------------
 # Mesh loaders (STL / 3MF)
 # ----------------------------
+
+# Mesh parsing and volume computation are CPU-bound and hold the GIL;
+# run them in worker processes so concurrent uploads use multiple cores
+# instead of blocking the event loop.
+MESH_POOL = ProcessPoolExecutor(max_workers=os.cpu_count() or 1)
+
+
+class MeshVolumeError(ValueError):
+    """Mesh parsed OK but its volume could not be estimated."""
+
+
+# Fast path for conforming 3MF exporters (x/y/z and v1/v2/v3 in canonical
+# order): one C-level regex scan replaces per-element tree walking. Files
+# bigger than this stay on the streaming parser to keep memory flat.
+_3MF_VERTEX_RE = re.compile(rb'<(?:\w+:)?vertex\s+x="([^"]+)"\s+y="([^"]+)"\s+z="([^"]+)"')
+_3MF_TRIANGLE_RE = re.compile(rb'<(?:\w+:)?triangle\s+v1="([^"]+)"\s+v2="([^"]+)"\s+v3="([^"]+)"')
+# Element-count probes: the attribute regexes above only match canonical
+# x/y/z (v1/v2/v3) order, so their match counts must equal these before
+# the fast path can be trusted — a partial match means reordered or
+# extra attributes and would silently drop elements.
+_3MF_VERTEX_TAG_RE = re.compile(rb"<(?:\w+:)?vertex[\s/>]")
+_3MF_TRIANGLE_TAG_RE = re.compile(rb"<(?:\w+:)?triangle[\s/>]")
+_3MF_REGEX_MAX_BYTES = 64 * 1024 * 1024
+
+
 def _mesh_from_trimesh_loaded(obj) -> trimesh.Trimesh:
-    if isinstance(obj, trimesh.Scene):
-        dumped = obj.dump()
-        if not dumped:
-            raise ValueError("Empty 3D scene")
-        obj = trimesh.util.concatenate(tuple(dumped))
+    # force="mesh" already collapses scenes into a single Trimesh
     if not isinstance(obj, trimesh.Trimesh):
         raise ValueError("Unsupported mesh type")
+    if obj.is_empty:
+        raise ValueError("Empty 3D scene")
     return obj
 
 
-def _load_mesh_from_stl_bytes(b: bytes) -> trimesh.Trimesh:
-    loaded = trimesh.load(io.BytesIO(b), file_type="stl")
+def _load_mesh_from_stl(fh) -> trimesh.Trimesh:
+    loaded = trimesh.load(
+        fh, file_type="stl", force="mesh", process=False, skip_materials=True
+    )
     return _mesh_from_trimesh_loaded(loaded)
 
 
-def _load_mesh_from_3mf_bytes(b: bytes) -> trimesh.Trimesh:
+def _load_mesh_from_3mf(fh) -> trimesh.Trimesh:
     # Try 1: trimesh direct
     try:
-        loaded = trimesh.load(io.BytesIO(b), file_type="3mf")
+        loaded = trimesh.load(
+            fh, file_type="3mf", force="mesh", process=False, skip_materials=True
+        )
         return _mesh_from_trimesh_loaded(loaded)
     except Exception:
         pass
 
     # Try 2: minimal 3MF XML parse from the zip
-    z = zipfile.ZipFile(io.BytesIO(b))
-    model_path = None
-    for p in z.namelist():
-        pl = p.lower()
-        if pl.endswith("3d/3dmodel.model") or pl.endswith("3dmodel.model"):
-            model_path = p
-            break
+    fh.seek(0)
+    z = zipfile.ZipFile(fh)
+    # Canonical path first: a dict hit instead of a Python scan over the
+    # central directory. Odd-case archives fall back to the full scan.
+    info = z.NameToInfo.get("3D/3dmodel.model") or z.NameToInfo.get("3d/3dmodel.model")
+    model_path = info.filename if info is not None else None
+    if not model_path:
+        for p in z.namelist():
+            pl = p.lower()
+            if pl.endswith("3d/3dmodel.model") or pl.endswith("3dmodel.model"):
+                model_path = p
+                break
     if not model_path:
         raise ValueError("3MF model file not found (3D/3dmodel.model)")
 
-    xml_bytes = z.read(model_path)
-    root = ET.fromstring(xml_bytes)
-
-    def strip_ns(tag: str) -> str:
-        return tag.split("}", 1)[-1] if "}" in tag else tag
-
-    vertices = []
-    faces = []
-    for elem in root.iter():
-        t = strip_ns(elem.tag)
-        if t == "vertex":
-            x = float(elem.attrib.get("x", "0"))
-            y = float(elem.attrib.get("y", "0"))
-            z_ = float(elem.attrib.get("z", "0"))
-            vertices.append((x, y, z_))
-        elif t == "triangle":
-            v1 = int(elem.attrib.get("v1", "0"))
-            v2 = int(elem.attrib.get("v2", "0"))
-            v3 = int(elem.attrib.get("v3", "0"))
-            faces.append((v1, v2, v3))
-
-    if not vertices or not faces:
+    # Fast path: regex-scan the raw bytes when the entry is small enough
+    # to hold in memory; falls through on non-canonical attribute order.
+    if z.getinfo(model_path).file_size <= _3MF_REGEX_MAX_BYTES:
+        xml_bytes = z.read(model_path)
+        vm = _3MF_VERTEX_RE.findall(xml_bytes)
+        tm = _3MF_TRIANGLE_RE.findall(xml_bytes)
+        if (
+            vm
+            and tm
+            and len(vm) == len(_3MF_VERTEX_TAG_RE.findall(xml_bytes))
+            and len(tm) == len(_3MF_TRIANGLE_TAG_RE.findall(xml_bytes))
+        ):
+            # float32 halves the transient parse buffer; trimesh upcasts
+            # to float64 at construction, mm-scale precision is unaffected.
+            v = np.array(vm, dtype=np.float32)
+            f = np.array(tm, dtype=np.int64)
+            return trimesh.Trimesh(vertices=v, faces=f, process=False)
+        del xml_bytes, vm, tm
+
+    # Stream the model XML straight out of the zip into the parser: the
+    # decompressed document never exists as one bytes object. Attribute
+    # values are collected as raw strings; numpy parses them in bulk, so
+    # there is no per-element float()/int() call in Python.
+    vxyz: list[str] = []
+    fidx: list[str] = []
+    with z.open(model_path) as entry:
+        src = io.BufferedReader(entry, buffer_size=1 << 20)
+        if LET is not None:
+            it = LET.iterparse(
+                src,
+                events=("end",),
+                tag=("{*}vertex", "{*}triangle"),
+                huge_tree=True,
+            )
+            for _event, elem in it:
+                a = elem.attrib
+                if elem.tag.endswith("vertex"):
+                    vxyz += (a.get("x", "0"), a.get("y", "0"), a.get("z", "0"))
+                else:
+                    fidx += (a.get("v1", "0"), a.get("v2", "0"), a.get("v3", "0"))
+                elem.clear(keep_tail=False)
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+        else:
+            for _event, elem in ET.iterparse(src, events=("end",)):
+                tag = elem.tag
+                if tag.endswith("}vertex") or tag == "vertex":
+                    a = elem.attrib
+                    vxyz += (a.get("x", "0"), a.get("y", "0"), a.get("z", "0"))
+                    elem.clear()
+                elif tag.endswith("}triangle") or tag == "triangle":
+                    a = elem.attrib
+                    fidx += (a.get("v1", "0"), a.get("v2", "0"), a.get("v3", "0"))
+                    elem.clear()
+
+    if not vxyz or not fidx:
         raise ValueError("3MF contains no mesh vertices/triangles")
 
-    v = np.array(vertices, dtype=np.float64)
-    f = np.array(faces, dtype=np.int64)
-    mesh = trimesh.Trimesh(vertices=v, faces=f, process=True)
+    v = np.array(vxyz, dtype=np.float32).reshape(-1, 3)
+    f = np.array(fidx, dtype=np.int64).reshape(-1, 3)
+    # process=False: merge_vertices/degenerate-face cleanup doesn't change
+    # the bbox or volume estimate, and costs O(n log n) on dense meshes.
+    mesh = trimesh.Trimesh(vertices=v, faces=f, process=False)
     return mesh
 
 
+def _signed_volume_mm3(mesh: trimesh.Trimesh) -> float:
+    """Sum of signed tetrahedra volumes over all triangles, in one
+    vectorized pass — no watertight check, no trimesh cache machinery."""
+    t = mesh.triangles.view(np.ndarray)
+    return float(abs(np.einsum("ij,ij->i", t[:, 0], np.cross(t[:, 1], t[:, 2])).sum()) / 6.0)
+
+
+def _parse_and_measure(path: str, fname: str) -> dict:
+    """Parse a mesh file on disk and measure bbox + volume.
+
+    Runs inside MESH_POOL workers, so it only takes/returns picklable
+    values (a path in, plain dict out).
+    """
+    with open(path, "rb") as fh:
+        if fname.endswith(".stl"):
+            mesh = _load_mesh_from_stl(fh)
+        elif fname.endswith(".3mf"):
+            mesh = _load_mesh_from_3mf(fh)
+        else:
+            raise ValueError("Only .stl or .3mf supported")
+
+    warnings: list[str] = []
+    # min/max over the raw vertex buffer; mesh.bounds would route through
+    # trimesh's cache/validation layers for the same answer.
+    v = mesh.vertices.view(np.ndarray)
+    dims = v.max(axis=0) - v.min(axis=0)
+    bbox_mm = {"x": float(dims[0]), "y": float(dims[1]), "z": float(dims[2])}
+
+    # The quote only needs a coarse volume: take the signed-tetrahedra sum
+    # directly and fall back to the (much slower) convex hull only when the
+    # result looks degenerate. Skips the full watertightness check.
+    vol_mm3 = _signed_volume_mm3(mesh)
+    if vol_mm3 <= 1e-6:
+        try:
+            vol_mm3 = float(mesh.convex_hull.volume)
+            warnings.append("Mesh not watertight; used convex-hull volume (approx).")
+        except Exception:
+            raise MeshVolumeError("Mesh volume could not be estimated")
+
+    return {"bbox_mm": bbox_mm, "vol_mm3": vol_mm3, "warnings": warnings}
+
+
 # ----------------------------
 # Public Routes
 # ----------------------------
+
+# route key -> (mtime_ns, serialized body, etag)
+_RESPONSE_CACHE: dict[str, tuple[int, bytes, str]] = {}
+
+
+def _cached_json_response(key: str, request: Request, build) -> Response:
+    """Serve a config-backed GET from orjson bytes cached per data.json
+    mtime, honoring If-None-Match so unchanged clients get a 304."""
+    mtime = DATA_PATH.stat().st_mtime_ns
+    hit = _RESPONSE_CACHE.get(key)
+    if hit is None or hit[0] != mtime:
+        body = orjson.dumps(build())
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        hit = (mtime, body, etag)
+        _RESPONSE_CACHE[key] = hit
+    _, body, etag = hit
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
+
+
 @app.get("/health")
 def health():
     return {"ok": True}
 
 
 @app.get("/settings")
-def get_settings():
-    return load_data()["settings"]
+def get_settings(request: Request):
+    return _cached_json_response("settings", request, lambda: load_data()["settings"])
 
 
 @app.get("/materials")
-def get_materials():
-    return load_data()["materials"]
+def get_materials(request: Request):
+    return _cached_json_response("materials", request, lambda: load_data()["materials"])
 
 
 @app.get("/machines")
-def get_machines():
-    return load_data()["machines"]
+def get_machines(request: Request):
+    return _cached_json_response("machines", request, lambda: load_data()["machines"])
 
 
-@app.get("/material-groups")
-def material_groups():
+def _build_material_groups() -> dict:
     data = load_data()
     mats = data["materials"]
     groups = {}
@@ -429,162 +793,203 @@ def material_groups():
     return {"material_groups": out}
 
 
-@app.post("/estimate", response_model=EstimateResponse)
+@app.get("/material-groups")
+def material_groups(request: Request):
+    return _cached_json_response("material-groups", request, _build_material_groups)
+
+
+@app.post("/estimate")
 async def estimate(
     file: UploadFile = File(...),
     material_id: str = Form(...),
     quality: str = Form("normal"),  # draft | normal | fine
 ):
-    data = load_data()
-    mats = {m["id"]: m for m in data["materials"]}
+    _, mats, _ = _load_data_cached()
     if material_id not in mats:
         raise HTTPException(400, "Unknown material_id")
 
     mat = mats[material_id]
     density = float(mat.get("density_g_cm3", 1.24))  # PLA default
-    warnings: list[str] = []
 
-    b = await file.read()
     fname = (file.filename or "").lower().strip()
+    # Declared size first (cheap reject), then a running count during the
+    # copy so a lying/chunked client can't blow past the cap either.
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, "Model file too large")
+
+    # Stream the upload to disk, then hand the path to a worker process;
+    # a path (unlike a spooled file handle) survives pickling.
+    tmp = tempfile.NamedTemporaryFile(suffix=".upload", delete=False)
     try:
-        if fname.endswith(".stl"):
-            mesh = _load_mesh_from_stl_bytes(b)
-        elif fname.endswith(".3mf"):
-            mesh = _load_mesh_from_3mf_bytes(b)
-        else:
-            raise ValueError("Only .stl or .3mf supported")
-    except Exception as e:
-        raise HTTPException(400, f"Could not parse model: {e}")
+        received = 0
+        while chunk := await file.read(1 << 20):
+            received += len(chunk)
+            if received > MAX_UPLOAD_BYTES:
+                raise HTTPException(413, "Model file too large")
+            tmp.write(chunk)
+        tmp.close()
+
+        loop = asyncio.get_running_loop()
+        try:
+            measured = await loop.run_in_executor(MESH_POOL, _parse_and_measure, tmp.name, fname)
+        except MeshVolumeError as e:
+            raise HTTPException(400, str(e))
+        except Exception as e:
+            raise HTTPException(400, f"Could not parse model: {e}")
+    finally:
+        tmp.close()
+        os.unlink(tmp.name)
+
+    bbox_mm = measured["bbox_mm"]
+    warnings: list[str] = measured["warnings"]
+    volume_cm3 = measured["vol_mm3"] / 1000.0
+
+    cfg = _estimate_cfg()
+    q = (quality or "normal").lower().strip()
+    q_mul = _QUALITY_MUL.get(q, 1.0)
+
+    estimated_grams = volume_cm3 * cfg.volume_factor * density * cfg.mass_mul
+    estimated_minutes = (cfg.fixed_min + (volume_cm3 * cfg.time_per_cm3)) * q_mul
+
+    # Plain dict response: the values are our own trusted floats, so
+    # there is nothing for a response model to validate.
+    return {
+        "volume_cm3": round(volume_cm3, 2),
+        "bbox_mm": {k: round(v, 2) for k, v in bbox_mm.items()},
+        "estimated_grams": round(estimated_grams, 1),
+        "estimated_minutes": round(estimated_minutes, 0),
+        "warnings": warnings,
+    }
 
-    bounds = mesh.bounds
-    dims = (bounds[1] - bounds[0]).tolist()
-    bbox_mm = {"x": float(dims[0]), "y": float(dims[1]), "z": float(dims[2])}
 
-    vol_mm3 = float(mesh.volume) if getattr(mesh, "is_watertight", False) else 0.0
-    if vol_mm3 <= 0:
-        try:
-            vol_mm3 = float(mesh.convex_hull.volume)
-            warnings.append("Mesh not watertight; used convex-hull volume (approx).")
-        except Exception:
-            raise HTTPException(400, "Mesh volume could not be estimated")
+class _MatCoeffs(NamedTuple):
+    price_per_kg: float
+    waste_mul: float  # 1 + waste_pct
 
-    volume_cm3 = vol_mm3 / 1000.0
 
-    s = data["settings"]
-    infill = float(s.get("estimate_infill_pct", 0.2))
-    shell = float(s.get("estimate_shell_overhead", 0.18))
-    support = float(s.get("estimate_support_overhead", 0.05))
-    time_per_cm3 = float(s.get("estimate_time_min_per_cm3", 2.8))
-    fixed_min = float(s.get("estimate_time_fixed_min", 12))
-    q = (quality or "normal").lower().strip()
+class _MachineCoeffs(NamedTuple):
+    power_kw: float
+    rate_per_hour: float  # purchase_price / life_hours
+    maintenance_per_hour: float  # rate_per_hour * maintenance_pct
+
+
+class _SettingsCoeffs(NamedTuple):
+    electricity_rate: float
+    overhead_pct: float
+    coloring_cost_per_hour: float
+    markup_mul: float  # 1 + markup_pct
+
+
+# (mtime_ns, settings coeffs, material coeffs by id, machine coeffs by id)
+_QUOTE_COEFFS_CACHE: tuple[int, _SettingsCoeffs, dict, dict] | None = None
 
-    q_mul = 1.0
-    if q == "draft":
-        q_mul = 0.75
-    elif q == "fine":
-        q_mul = 1.35
-
-    volume_factor = min(1.0, max(0.05, infill + shell + support))
-    printed_volume_cm3 = volume_cm3 * volume_factor
-    mass_mul = float(s.get("estimate_mass_multiplier", 1.0))
-
-    estimated_grams = printed_volume_cm3 * density * mass_mul
-    estimated_minutes = (fixed_min + (volume_cm3 * time_per_cm3)) * q_mul
-
-    return EstimateResponse(
-        volume_cm3=round(volume_cm3, 2),
-        bbox_mm={k: round(v, 2) for k, v in bbox_mm.items()},
-        estimated_grams=round(estimated_grams, 1),
-        estimated_minutes=round(estimated_minutes, 0),
-        warnings=warnings,
-    )
 
+def _quote_coeffs() -> tuple[_SettingsCoeffs, dict, dict]:
+    """Per-material/machine pricing coefficients, rebuilt only when
+    data.json changes, so _quote_calc does no float() casts or divisions
+    over config values."""
+    global _QUOTE_COEFFS_CACHE
+    mtime = DATA_PATH.stat().st_mtime_ns
+    cached = _QUOTE_COEFFS_CACHE
+    if cached is not None and cached[0] == mtime:
+        return cached[1], cached[2], cached[3]
 
-def _quote_calc(req: QuoteRequest) -> QuoteResponse:
     data = load_data()
-    settings = data["settings"]
-    mats = {m["id"]: m for m in data["materials"]}
-    machines = {m["id"]: m for m in data["machines"]}
+    s = data["settings"]
+    settings_c = _SettingsCoeffs(
+        electricity_rate=float(s["electricity_rate_per_kwh"]),
+        overhead_pct=float(s["overhead_pct"]),
+        coloring_cost_per_hour=float(s["coloring_cost_per_hour"]),
+        markup_mul=1.0 + float(s.get("markup_pct", 0)),
+    )
+    mats_c = {
+        m["id"]: _MatCoeffs(
+            price_per_kg=float(m["price_per_kg"]),
+            waste_mul=1.0 + float(m.get("waste_pct", 0)),
+        )
+        for m in data["materials"]
+    }
+    machines_c = {}
+    for m in data["machines"]:
+        life = float(m["life_hours"])
+        rate_per_hour = (float(m["purchase_price"]) / life) if life > 0 else 0.0
+        machines_c[m["id"]] = _MachineCoeffs(
+            power_kw=float(m["power_w"]) / 1000.0,
+            rate_per_hour=rate_per_hour,
+            maintenance_per_hour=rate_per_hour * float(m.get("maintenance_pct", 0)),
+        )
+    _QUOTE_COEFFS_CACHE = (mtime, settings_c, mats_c, machines_c)
+    return settings_c, mats_c, machines_c
 
-    if req.material_id not in mats:
+
+def _quote_calc(req: QuoteRequest) -> dict:
+    s, mats_c, machines_c = _quote_coeffs()
+
+    if req.material_id not in mats_c:
         raise HTTPException(400, "Unknown material_id")
-    if req.machine_id not in machines:
+    if req.machine_id not in machines_c:
         raise HTTPException(400, "Unknown machine_id")
 
-    mat = mats[req.material_id]
-    mc = machines[req.machine_id]
+    mat = mats_c[req.material_id]
+    mc = machines_c[req.machine_id]
 
     qty = int(req.qty)
     grams_per_item = float(req.filament_grams)
-    minutes_per_item = float(req.print_time_minutes)
-    hours_per_item = minutes_per_item / 60.0
+    hours_per_item = float(req.print_time_minutes) / 60.0
     post_pro_hours_per_item = float(req.post_pro_hours)
 
-    electricity_rate = float(settings["electricity_rate_per_kwh"])
-    overhead_pct = float(settings["overhead_pct"])
-    coloring_cost_per_hour = float(settings["coloring_cost_per_hour"])
-    markup_pct = float(settings.get("markup_pct", 0))
-
-    waste_pct = float(mat.get("waste_pct", 0))
-    effective_grams = grams_per_item * (1.0 + waste_pct)
-    price_per_kg = float(mat["price_per_kg"])
-
-    Matrial_t = qty * (effective_grams / 1000.0) * price_per_kg
-
-    power_w = float(mc["power_w"])
-    power_t = qty * (power_w / 1000.0) * hours_per_item * electricity_rate
+    Matrial_t = qty * (grams_per_item * mat.waste_mul / 1000.0) * mat.price_per_kg
 
-    price = float(mc["purchase_price"])
-    life = float(mc["life_hours"])
-    pct = float(mc.get("maintenance_pct", 0))
+    power_t = qty * mc.power_kw * hours_per_item * s.electricity_rate
 
-    rate_per_hour = (price / life) if life > 0 else 0.0
-    downturn_t = qty * hours_per_item * rate_per_hour
-    Maintenance_t = qty * hours_per_item * (rate_per_hour * pct)
+    downturn_t = qty * hours_per_item * mc.rate_per_hour
+    Maintenance_t = qty * hours_per_item * mc.maintenance_per_hour
 
-    Coloring_t = qty * post_pro_hours_per_item * coloring_cost_per_hour
+    Coloring_t = qty * post_pro_hours_per_item * s.coloring_cost_per_hour
 
     base = Matrial_t + power_t + downturn_t + Maintenance_t + Coloring_t
-    overhead_t = overhead_pct * base
+    overhead_t = s.overhead_pct * base
 
     Extras = float(req.extras)
-    subtotal = base + overhead_t + Extras
-    Total = subtotal * (1.0 + markup_pct)
+    Total = (base + overhead_t + Extras) * s.markup_mul
 
     def r0(x: float) -> float:
         return float(round(x, 0))
 
-    return QuoteResponse(
-        Matrial_t=r0(Matrial_t),
-        power_t=r0(power_t),
-        downturn_t=r0(downturn_t),
-        Maintenance_t=r0(Maintenance_t),
-        Coloring_t=r0(Coloring_t),
-        overhead_t=r0(overhead_t),
-        Extras=r0(Extras),
-        Total=r0(Total),
-    )
+    return {
+        "Matrial_t": r0(Matrial_t),
+        "power_t": r0(power_t),
+        "downturn_t": r0(downturn_t),
+        "Maintenance_t": r0(Maintenance_t),
+        "Coloring_t": r0(Coloring_t),
+        "overhead_t": r0(overhead_t),
+        "Extras": r0(Extras),
+        "Total": r0(Total),
+    }
 
 
-@app.post("/quote", response_model=QuoteResponse)
-def quote(req: QuoteRequest):
-    # Public همیشه پرینتر ثابت
+@app.post("/quote")
+async def quote(request: Request):
     try:
-        req2 = req.model_copy(update={"machine_id": PUBLIC_DEFAULT_MACHINE_ID})
-    except AttributeError:
-        req2 = req.copy(update={"machine_id": PUBLIC_DEFAULT_MACHINE_ID})
-    return _quote_calc(req2)
+        req = _QUOTE_DECODER.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(422, str(e))
+    # Public همیشه پرینتر ثابت
+    req.machine_id = PUBLIC_DEFAULT_MACHINE_ID
+    return Response(_QUOTE_ENCODER.encode(_quote_calc(req)), media_type="application/json")
 
 
 # ----------------------------
 # Auth Routes (Staff)
 # ----------------------------
 @app.post("/auth/login")
-def auth_login(req: LoginRequest):
+async def auth_login(req: LoginRequest):
+    # bcrypt burns ~100ms of CPU per verify by design; run it in the
+    # threadpool so a login doesn't stall every other request.
     # Admin first, then staff
     if ADMIN_USERS:
         stored_hash = ADMIN_USERS.get(req.username)
-        if stored_hash and pwd_context.verify(req.password, stored_hash):
+        if stored_hash and await _verify_password(req.username, req.password, stored_hash):
             token = create_access_token(req.username, role="admin")
             return {"access_token": token, "token_type": "bearer", "role": "admin"}
 
@@ -593,7 +998,7 @@ def auth_login(req: LoginRequest):
         raise HTTPException(500, "STAFF_USERS not configured")
 
     stored_hash = users.get(req.username)
-    if not stored_hash or not pwd_context.verify(req.password, stored_hash):
+    if not stored_hash or not await _verify_password(req.username, req.password, stored_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     token = create_access_token(req.username, role="staff")
@@ -625,11 +1030,10 @@ def admin_put_config(payload: AdminConfigPayload, username: str = Depends(get_cu
 def admin_audit(username: str = Depends(get_current_admin)):
     if not AUDIT_LOG_PATH.exists():
         return {"entries": []}
-    lines = AUDIT_LOG_PATH.read_text(encoding="utf-8").splitlines()[-200:]
     entries = []
-    for ln in lines:
+    for ln in _tail_lines(AUDIT_LOG_PATH, 200):
         try:
-            entries.append(json.loads(ln))
+            entries.append(orjson.loads(ln))
         except Exception:
             continue
     return {"entries": entries}
@@ -637,13 +1041,17 @@ def admin_audit(username: str = Depends(get_current_admin)):
 # ----------------------------
 # Staff Routes (Protected)
 # ----------------------------
-@app.post("/staff/quote", response_model=QuoteResponse)
-def staff_quote(req: QuoteRequest, username: str = Depends(get_current_staff)):
+@app.post("/staff/quote")
+async def staff_quote(request: Request, username: str = Depends(get_current_staff)):
+    try:
+        req = _QUOTE_DECODER.decode(await request.body())
+    except msgspec.DecodeError as e:
+        raise HTTPException(422, str(e))
     # Staff آزاد: همون machine_id انتخابی
-    return _quote_calc(req)
+    return Response(_QUOTE_ENCODER.encode(_quote_calc(req)), media_type="application/json")
 
 
-@app.post("/staff/estimate", response_model=EstimateResponse)
+@app.post("/staff/estimate")
 async def staff_estimate(
     file: UploadFile = File(...),
     material_id: str = Form(...),